@@ -1,8 +1,11 @@
 #!/usr/bin/env python3
+import os
 import re
 import subprocess
 import shutil
-import html
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatchcase
 from pathlib import Path
 from typing import List, Tuple, Dict
 
@@ -15,6 +18,38 @@ SITE_NAME = "Avatar: The Last Airbender Scripts"
 SITE_URL = "https://codefarmer2024.github.io/avatar-the-last-airbender/"
 REPO_URL = "https://github.com/CodeFarmer2024/avatar-the-last-airbender"
 
+EPISODE_TMPL = "# {title}\n\n**Languages:** {langs}\n\n{body}"
+SECTION_TMPL = "## {heading}\n\n{block}\n"
+SCRIPT_BLOCK_TMPL = '<pre class="script">\n{text}\n</pre>'
+TWO_COLUMN_TMPL = """\
+<table class="script-table">
+  <thead>
+    <tr>
+      <th>English</th>
+      <th>中文</th>
+    </tr>
+  </thead>
+  <tbody>
+    <tr>
+      <td>{en}</td>
+      <td>{zh}</td>
+    </tr>
+  </tbody>
+</table>
+"""
+
+_EP_STEM_RE = re.compile(r"^(\d{3})$")
+_RANGE_RE = re.compile(r"(\d{3})-(\d{3})")
+_DDD_RE = re.compile(r"(\d{3})")
+_WS_RE = re.compile(r"\s+")
+_NORMALIZE_TABLE = str.maketrans({"\t": "    ", "\x0c": "\n"})
+# Quotes need no escaping inside <pre> element content
+_HTML_ESCAPE_TABLE = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;"})
+
+# Resolved once; read_doc_file raises if neither converter is available.
+_TEXTUTIL = shutil.which("textutil")
+_ANTIWORD = shutil.which("antiword")
+
 
 def read_text_file(path: Path) -> str:
     text = path.read_text(encoding="utf-8", errors="ignore")
@@ -23,51 +58,40 @@ def read_text_file(path: Path) -> str:
 
 
 def read_doc_file(path: Path) -> str:
-    textutil = shutil.which("textutil")
-    antiword = shutil.which("antiword")
-
-    if textutil:
-        out = subprocess.check_output(
-            [textutil, "-convert", "txt", "-stdout", str(path)]
-        )
-    elif antiword:
-        out = subprocess.check_output([antiword, str(path)])
+    if _TEXTUTIL:
+        cmd = [_TEXTUTIL, "-convert", "txt", "-stdout", str(path)]
+    elif _ANTIWORD:
+        cmd = [_ANTIWORD, str(path)]
     else:
         raise FileNotFoundError(
             "Missing converter. Install 'antiword' (Linux) or use macOS 'textutil'."
         )
 
-    text = out.decode("utf-8", errors="ignore")
-    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    # Decode while reading; text mode also translates \r\n and \r to \n.
+    with subprocess.Popen(
+        cmd, stdout=subprocess.PIPE, encoding="utf-8", errors="ignore"
+    ) as proc:
+        text = proc.stdout.read()
+    if proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, cmd)
     return text.lstrip("\ufeff")
 
 
 def normalize_block(text: str) -> str:
-    # Trim trailing whitespace on each line and remove excessive leading/trailing blank lines
-    text = text.replace("\t", "    ").replace("\x0c", "\n")
-    lines = [ln.rstrip().lstrip(" ") for ln in text.split("\n")]
-    while lines and lines[0].strip() == "":
-        lines.pop(0)
-    while lines and lines[-1].strip() == "":
-        lines.pop()
-    # Collapse consecutive blank lines to a single blank line
-    compact = []
+    # Trim whitespace on each line, drop leading/trailing blank lines and
+    # collapse consecutive blank lines to a single blank line in one pass.
+    # Lines are left-stripped individually, so no common indent remains.
+    compact: List[str] = []
     blank = False
-    for ln in lines:
-        if ln.strip() == "":
-            if not blank:
+    for ln in text.translate(_NORMALIZE_TABLE).split("\n"):
+        ln = ln.rstrip().lstrip(" ")
+        if ln:
+            if blank and compact:
                 compact.append("")
-            blank = True
-        else:
             compact.append(ln)
             blank = False
-    # Remove common leading indentation
-    non_empty = [ln for ln in compact if ln.strip() != ""]
-    if not non_empty:
-        return ""
-    min_indent = min(len(ln) - len(ln.lstrip(" ")) for ln in non_empty)
-    if min_indent > 0:
-        compact = [ln[min_indent:] if len(ln) >= min_indent else "" for ln in compact]
+        else:
+            blank = True
     return "\n".join(compact)
 
 
@@ -76,12 +100,12 @@ def find_title(text: str) -> str:
         stripped = line.strip()
         if stripped:
             # First non-empty line is usually a title; keep it short
-            return re.sub(r"\s+", " ", stripped)
+            return _WS_RE.sub(" ", stripped)
     return ""
 
 
 def parse_episode_number(stem: str) -> int:
-    m = re.match(r"^(\d{3})$", stem)
+    m = _EP_STEM_RE.match(stem)
     if not m:
         raise ValueError(f"Unexpected episode filename: {stem}")
     return int(m.group(1))
@@ -91,29 +115,30 @@ def split_by_episode(text: str) -> List[str]:
     lines = text.split("\n")
     indices = []
     for i, line in enumerate(lines):
-        if re.match(r"^第.+回", line.strip()):
+        # Episode headers look like "第X回..."; equivalent to matching ^第.+回
+        s = line.lstrip()
+        if s.startswith("第") and "回" in s[2:]:
             indices.append(i)
     if not indices:
         return [text]
 
-    chunks = []
-    for idx, start in enumerate(indices):
-        end = indices[idx + 1] if idx + 1 < len(indices) else len(lines)
-        chunk = "\n".join(lines[start:end])
-        chunks.append(chunk)
-    return chunks
+    ends = indices[1:] + [len(lines)]
+    return ["\n".join(lines[start:end]) for start, end in zip(indices, ends)]
 
 
-def load_english() -> Dict[int, str]:
-    out: Dict[int, str] = {}
-    for path in sorted(EN_DIR.glob("*.txt")):
-        num = parse_episode_number(path.stem)
-        out[num] = normalize_block(read_text_file(path))
+def load_english() -> Dict[int, Tuple[str, str]]:
+    # Maps episode number to (text, title) so each script is scanned once
+    out: Dict[int, Tuple[str, str]] = {}
+    names = sorted(e.name for e in os.scandir(EN_DIR) if e.name.endswith(".txt"))
+    for name in names:
+        num = parse_episode_number(name[: -len(".txt")])
+        text = normalize_block(read_text_file(EN_DIR / name))
+        out[num] = (text, find_title(text))
     return out
 
 
 def parse_range_from_name(name: str) -> Tuple[int, int]:
-    m = re.search(r"(\d{3})-(\d{3})", name)
+    m = _RANGE_RE.search(name)
     if not m:
         raise ValueError(f"Unexpected range in filename: {name}")
     return int(m.group(1)), int(m.group(2))
@@ -121,24 +146,36 @@ def parse_range_from_name(name: str) -> Tuple[int, int]:
 
 def load_chinese() -> Dict[int, str]:
     out: Dict[int, str] = {}
-    # single episode docs
-    for path in sorted(ZH_DIR.glob("avatar 1??.doc")):
-        # skip range files for now
-        if re.search(r"\d{3}-\d{3}", path.name):
+    singles: List[Tuple[int, Path]] = []
+    ranges: List[Path] = []
+    # Enumerate the directory once and bucket into range files and
+    # single episode docs ("avatar 1??.doc").
+    names = sorted(e.name for e in os.scandir(ZH_DIR) if e.name.startswith("avatar "))
+    for name in names:
+        if not name.endswith(".doc"):
             continue
-        m = re.search(r"(\d{3})", path.name)
+        if _RANGE_RE.search(name):
+            ranges.append(ZH_DIR / name)
+            continue
+        if not fnmatchcase(name, "avatar 1??.doc"):
+            continue
+        m = _DDD_RE.search(name)
         if not m:
             continue
-        num = int(m.group(1))
-        out[num] = normalize_block(read_doc_file(path))
+        singles.append((int(m.group(1)), ZH_DIR / name))
 
-    # range files
-    for path in sorted(ZH_DIR.glob("avatar *.doc")):
-        if not re.search(r"\d{3}-\d{3}", path.name):
-            continue
+    # Each conversion is a separate antiword/textutil process, so run them
+    # concurrently and only do the text processing afterwards.
+    paths = [path for _, path in singles] + ranges
+    with ThreadPoolExecutor(max_workers=os.cpu_count()) as ex:
+        raw = dict(zip(paths, ex.map(read_doc_file, paths)))
+
+    for num, path in singles:
+        out[num] = normalize_block(raw[path])
+
+    for path in ranges:
         start, end = parse_range_from_name(path.name)
-        text = read_doc_file(path)
-        chunks = [normalize_block(c) for c in split_by_episode(text)]
+        chunks = [normalize_block(c) for c in split_by_episode(raw[path])]
         expected = list(range(start, end + 1))
         if len(chunks) != len(expected):
             # If the file contains more/less episodes than the filename suggests,
@@ -155,6 +192,10 @@ def season_episode(num: int) -> Tuple[int, int]:
     return num // 100, num % 100
 
 
+def season_dir(season: int) -> Path:
+    return DOCS_DIR / f"season-{season:02d}"
+
+
 def episode_slug(num: int) -> str:
     season, ep = season_episode(num)
     return f"s{season:02d}e{ep:02d}"
@@ -165,53 +206,39 @@ def indent_lines(lines: List[str], spaces: int = 4) -> List[str]:
     return [prefix + ln if ln != "" else "" for ln in lines]
 
 
-def render_script_block(text: str) -> List[str]:
-    escaped = html.escape(text)
-    return [
-        '<pre class="script">',
-        escaped,
-        "</pre>",
-        "",
-    ]
+def render_script_block(text: str) -> str:
+    return SCRIPT_BLOCK_TMPL.format(text=text.translate(_HTML_ESCAPE_TABLE))
 
 
-def render_two_column(en_text: str, zh_text: str) -> List[str]:
-    en_block = "\n".join(render_script_block(en_text)).strip()
-    zh_block = "\n".join(render_script_block(zh_text)).strip()
-    return [
-        '<table class="script-table">',
-        "  <thead>",
-        "    <tr>",
-        "      <th>English</th>",
-        "      <th>中文</th>",
-        "    </tr>",
-        "  </thead>",
-        "  <tbody>",
-        "    <tr>",
-        f"      <td>{en_block}</td>",
-        f"      <td>{zh_block}</td>",
-        "    </tr>",
-        "  </tbody>",
-        "</table>",
-        "",
-    ]
+def render_two_column(en_text: str, zh_text: str) -> str:
+    return TWO_COLUMN_TMPL.format(
+        en=render_script_block(en_text), zh=render_script_block(zh_text)
+    )
 
 
-def build_episode_title(num: int, en_text: str) -> str:
+def write_output(path: Path, text: str):
+    # Encode once and skip the text I/O layer; also keeps LF line endings.
+    # Files whose content is unchanged are not rewritten, so their mtimes
+    # stay put and mkdocs does not see them as modified.
+    data = text.encode("utf-8")
+    try:
+        if path.stat().st_size == len(data) and path.read_bytes() == data:
+            return
+    except FileNotFoundError:
+        pass
+    path.write_bytes(data)
+
+
+def build_episode_title(num: int, en_title: str) -> str:
     season, ep = season_episode(num)
     title = f"S{season:02d}E{ep:02d}"
-    en_title = find_title(en_text) if en_text else ""
     if en_title and en_title.lower() not in title.lower():
         title = f"{title} - {en_title}"
     return title
 
 
-def write_episode_md(num: int, en_text: str, zh_text: str) -> str:
+def write_episode_md(num: int, title: str, en_text: str, zh_text: str):
     season, _ = season_episode(num)
-    season_dir = DOCS_DIR / f"season-{season:02d}"
-    season_dir.mkdir(parents=True, exist_ok=True)
-
-    title = build_episode_title(num, en_text)
 
     langs = []
     if en_text:
@@ -220,20 +247,18 @@ def write_episode_md(num: int, en_text: str, zh_text: str) -> str:
         langs.append("中文")
     langs_label = " / ".join(langs) if langs else "N/A"
 
-    lines = [f"# {title}", "", f"**Languages:** {langs_label}", ""]
     if en_text and zh_text:
-        lines += render_two_column(en_text, zh_text)
+        body = render_two_column(en_text, zh_text)
+    elif en_text:
+        body = SECTION_TMPL.format(heading="English", block=render_script_block(en_text))
+    elif zh_text:
+        body = SECTION_TMPL.format(heading="中文", block=render_script_block(zh_text))
     else:
-        if en_text:
-            lines += ["## English", ""] + render_script_block(en_text)
-        if zh_text:
-            lines += ["## 中文", ""] + render_script_block(zh_text)
-        if not en_text and not zh_text:
-            lines += ["_No script content available._", ""]
-
-    path = season_dir / f"{episode_slug(num)}.md"
-    path.write_text("\n".join(lines).rstrip() + "\n", encoding="utf-8")
-    return title
+        body = "_No script content available._"
+    content = EPISODE_TMPL.format(title=title, langs=langs_label, body=body)
+
+    path = season_dir(season) / f"{episode_slug(num)}.md"
+    write_output(path, content.rstrip() + "\n")
 
 
 def write_indexes(
@@ -258,18 +283,16 @@ def write_indexes(
                 "- Missing 中文: "
                 + ", ".join(episode_slug(n).upper() for n in missing_zh)
             )
-    (DOCS_DIR / "index.md").write_text("\n".join(idx) + "\n", encoding="utf-8")
+    write_output(DOCS_DIR / "index.md", "\n".join(idx) + "\n")
 
     # Season indexes
     for season, nums in sorted(season_nums.items()):
-        season_dir = DOCS_DIR / f"season-{season:02d}"
-        season_dir.mkdir(parents=True, exist_ok=True)
         lines = [f"# Season {season}", ""]
         for num in nums:
             slug = episode_slug(num)
             title = titles.get(num, slug.upper())
             lines.append(f"- [{title}](./{slug}.md)")
-        (season_dir / "index.md").write_text("\n".join(lines) + "\n", encoding="utf-8")
+        write_output(season_dir(season) / "index.md", "\n".join(lines) + "\n")
 
 
 def write_mkdocs(season_nums: Dict[int, List[int]]):
@@ -292,33 +315,39 @@ def write_mkdocs(season_nums: Dict[int, List[int]]):
         for num in season_nums[season]:
             slug = episode_slug(num)
             lines.append(f"      - {slug.upper()}: season-{season:02d}/{slug}.md")
-    (ROOT / "mkdocs.yml").write_text("\n".join(lines) + "\n", encoding="utf-8")
+    write_output(ROOT / "mkdocs.yml", "\n".join(lines) + "\n")
 
 
 def main():
     DOCS_DIR.mkdir(parents=True, exist_ok=True)
-    en = load_english()
-    zh = load_chinese()
+    # The Chinese side is bound by converter subprocesses, so read the
+    # English scripts while it runs.
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        fen, fzh = ex.submit(load_english), ex.submit(load_chinese)
+        en, zh = fen.result(), fzh.result()
 
     all_nums = sorted(set(en.keys()) | set(zh.keys()))
-    season_nums: Dict[int, List[int]] = {1: [], 2: [], 3: []}
+    season_nums: Dict[int, List[int]] = defaultdict(list)
     titles: Dict[int, str] = {}
     missing_en = []
     missing_zh = []
 
+    # all_nums is sorted, so each season's list is built in order.
     for num in all_nums:
         season, _ = season_episode(num)
         if season not in season_nums:
-            continue
+            # Season directories are created once; the writers assume they exist.
+            season_dir(season).mkdir(parents=True, exist_ok=True)
         season_nums[season].append(num)
-        titles[num] = write_episode_md(num, en.get(num, ""), zh.get(num, ""))
-        if num not in en:
+        if (en_entry := en.get(num)) is None:
             missing_en.append(num)
-        if num not in zh:
+            en_entry = ("", "")
+        if (zh_text := zh.get(num)) is None:
             missing_zh.append(num)
+        en_text, en_title = en_entry
+        titles[num] = build_episode_title(num, en_title)
+        write_episode_md(num, titles[num], en_text, zh_text or "")
 
-    for season in season_nums:
-        season_nums[season] = sorted(season_nums[season])
     write_indexes(season_nums, titles, missing_en, missing_zh)
     write_mkdocs(season_nums)
 